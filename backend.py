@@ -1,27 +1,161 @@
+import heapq
 import json
 import os
+import queue
 import sqlite3
 import random
-from typing import Any, Dict, List, Optional, Sequence, Tuple
+import struct
+import sys
+import time
+from array import array
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Set, Tuple, Union
 
 DB_PATH = os.environ.get("DB_PATH", os.path.join(os.path.dirname(__file__), "db.sqlite3"))
+# Optional: spread sessions/answers over this many SQLite files, keyed by user_id.
+# Test content (tests/questions/options) and broadcasts always stay in DB_PATH.
+# Pick the shard count before the first run: init_db() refuses to start with
+# DB_SHARDS > 1 while DB_PATH still holds sessions, since those would vanish.
+DB_SHARDS = max(1, int(os.environ.get("DB_SHARDS", "1")))
+# Idle read-only connections kept per database file (see read_connection());
+# 0 or less disables pooling.
+READ_POOL_SIZE = int(os.environ.get("READ_POOL_SIZE", "4"))
+
+
+def _connect(path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(path)
+    conn.row_factory = sqlite3.Row
+    return conn
 
 
 def get_connection() -> sqlite3.Connection:
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    return conn
+    return _connect(DB_PATH)
+
+
+# -------- Read-only pool --------
+# Heavy reads (results, listings, broadcast paging) use pooled ``mode=ro``
+# connections. With the database in WAL mode they read a snapshot and never
+# block record_answer() and the other writers; the bot also runs them off the
+# event loop. Connections may be handed between threads but are used by one
+# at a time.
+_read_pools: Dict[str, "queue.LifoQueue[sqlite3.Connection]"] = {}
+
+
+def _ro_uri(path: str) -> str:
+    return Path(path).resolve().as_uri() + "?mode=ro"
+
+
+@contextmanager
+def read_connection(path: Optional[str] = None) -> Iterator[sqlite3.Connection]:
+    path = path or DB_PATH
+    pool: Optional["queue.LifoQueue[sqlite3.Connection]"] = None
+    conn: Optional[sqlite3.Connection] = None
+    if READ_POOL_SIZE > 0:
+        pool = _read_pools.setdefault(path, queue.LifoQueue(maxsize=READ_POOL_SIZE))
+        try:
+            conn = pool.get_nowait()
+        except queue.Empty:
+            pass
+    if conn is None:
+        # mode=ro cannot create the file, so make sure the schema exists first
+        init_db()
+        conn = sqlite3.connect(_ro_uri(path), uri=True, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        if path != DB_PATH:
+            # session shard: expose the content tables for joins
+            conn.execute("ATTACH DATABASE ? AS content", (_ro_uri(DB_PATH),))
+    try:
+        yield conn
+    finally:
+        if pool is None:
+            conn.close()
+        else:
+            try:
+                pool.put_nowait(conn)
+            except queue.Full:
+                conn.close()
+
+
+# -------- Session shards --------
+# With DB_SHARDS > 1 a user's sessions live in shard ``user_id % DB_SHARDS`` and
+# session ids are allocated so that ``session_id % DB_SHARDS`` names the same
+# shard; every session helper can therefore route on the id alone.
+def shard_path(shard: int) -> str:
+    if DB_SHARDS <= 1:
+        return DB_PATH
+    root, ext = os.path.splitext(DB_PATH)
+    return f"{root}.shard{shard}{ext}"
+
+
+def get_session_connection(shard: int) -> sqlite3.Connection:
+    return _connect(shard_path(shard))
+
+
+def _user_shard(user_id: int) -> int:
+    return user_id % DB_SHARDS
+
+
+def _session_shard(session_id: int) -> int:
+    return session_id % DB_SHARDS
+
+
+# Bump when init_db() gains a data migration.
+SCHEMA_VERSION = 1
+
+_initialized_paths: Set[str] = set()
 
 
 def init_db() -> None:
+    content_paths = {DB_PATH}
+    session_paths = {shard_path(s) for s in range(DB_SHARDS)}
+    if DB_SHARDS > 1 and DB_PATH not in _initialized_paths:
+        _check_no_unsharded_sessions()
+    for path in sorted(content_paths | session_paths):
+        if path in _initialized_paths:
+            continue
+        conn = _connect(path)
+        cur = conn.cursor()
+        # readers see a snapshot and do not block the writer (persistent setting)
+        cur.execute("PRAGMA journal_mode=WAL")
+        if path in content_paths:
+            _create_content_tables(cur)
+        if path in session_paths:
+            _create_session_tables(cur)
+        version = cur.execute("PRAGMA user_version").fetchone()[0]
+        if version < 1 and path in session_paths:
+            _migrate_questions_to_blob(cur)
+        if version < SCHEMA_VERSION:
+            cur.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        conn.commit()
+        conn.close()
+        _initialized_paths.add(path)
+
+
+def _check_no_unsharded_sessions() -> None:
+    if not os.path.exists(DB_PATH):
+        return
     conn = get_connection()
     cur = conn.cursor()
+    has_table = cur.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sessions'").fetchone()
+    has_rows = bool(has_table and cur.execute("SELECT 1 FROM sessions LIMIT 1").fetchone())
+    conn.close()
+    if has_rows:
+        raise RuntimeError(
+            f"{DB_PATH} already has quiz sessions; they would be invisible with DB_SHARDS={DB_SHARDS}. "
+            "Keep DB_SHARDS=1 for this database or start sharding with a fresh one."
+        )
+
+
+def _create_content_tables(cur: sqlite3.Cursor) -> None:
     cur.execute(
         """
         CREATE TABLE IF NOT EXISTS tests (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             title TEXT NOT NULL,
-            description TEXT
+            description TEXT,
+            time_limit INTEGER,
+            question_time_limit INTEGER
         );
         """
     )
@@ -46,6 +180,28 @@ def init_db() -> None:
         );
         """
     )
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS broadcasts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            admin_id INTEGER NOT NULL,
+            text TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'running',
+            last_user_id INTEGER NOT NULL DEFAULT 0,
+            delivered INTEGER NOT NULL DEFAULT 0,
+            failed INTEGER NOT NULL DEFAULT 0,
+            blocked INTEGER NOT NULL DEFAULT 0,
+            created_at TEXT NOT NULL DEFAULT (datetime('now')),
+            finished_at TEXT
+        );
+        """
+    )
+    # timed quizzes: limits are in seconds
+    _ensure_column(cur, "tests", "time_limit", "INTEGER")
+    _ensure_column(cur, "tests", "question_time_limit", "INTEGER")
+
+
+def _create_session_tables(cur: sqlite3.Cursor) -> None:
     # quiz sessions
     cur.execute(
         """
@@ -60,7 +216,10 @@ def init_db() -> None:
             total_answered INTEGER NOT NULL DEFAULT 0,
             status TEXT NOT NULL DEFAULT 'active',
             started_at TEXT NOT NULL DEFAULT (datetime('now')),
-            ended_at TEXT
+            ended_at TEXT,
+            deadline_at REAL,
+            question_time_limit INTEGER,
+            question_deadline_at REAL
         );
         """
     )
@@ -77,8 +236,60 @@ def init_db() -> None:
         );
         """
     )
-    conn.commit()
-    conn.close()
+    # keyset pagination over distinct users (broadcasts) and per-user lookups
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_sessions_user ON sessions(user_id)")
+    # timed quizzes: deadlines are unix timestamps
+    _ensure_column(cur, "sessions", "deadline_at", "REAL")
+    _ensure_column(cur, "sessions", "question_time_limit", "INTEGER")
+    _ensure_column(cur, "sessions", "question_deadline_at", "REAL")
+
+
+def _ensure_column(cur: sqlite3.Cursor, table: str, column: str, decl: str) -> None:
+    cols = {r[1] for r in cur.execute(f"PRAGMA table_info({table})")}
+    if column not in cols:
+        cur.execute(f"ALTER TABLE {table} ADD COLUMN {column} {decl}")
+
+
+def _migrate_questions_to_blob(cur: sqlite3.Cursor) -> None:
+    """Re-encode legacy JSON ``questions_json`` rows as packed id blobs."""
+    cur.execute("SELECT id, questions_json FROM sessions WHERE typeof(questions_json) = 'text'")
+    rows = cur.fetchall()
+    cur.executemany(
+        "UPDATE sessions SET questions_json = ? WHERE id = ?",
+        [(pack_question_ids(json.loads(r[1]) or []), r[0]) for r in rows],
+    )
+
+
+# -------- Question list encoding --------
+# sessions.questions_json holds the selected question ids as little-endian
+# uint32 values packed into a BLOB (4 bytes per id instead of a JSON string).
+_ID_FORMAT = "<{}I"
+_NATIVE_LE = sys.byteorder == "little" and array("I").itemsize == 4
+
+
+def pack_question_ids(ids: Sequence[int]) -> bytes:
+    return struct.pack(_ID_FORMAT.format(len(ids)), *ids)
+
+
+def unpack_question_ids(payload: Union[bytes, str, None]) -> Sequence[int]:
+    """Decode a stored question list without copying where possible.
+
+    On little-endian hosts the result is a ``memoryview`` over the row's bytes;
+    legacy JSON text (rows not yet migrated) is still understood.
+    """
+    if payload is None:
+        return []
+    if isinstance(payload, str):
+        return json.loads(payload) or []
+    if _NATIVE_LE:
+        return memoryview(payload).cast("I")
+    return struct.unpack(_ID_FORMAT.format(len(payload) // 4), payload)
+
+
+def question_count(payload: Union[bytes, str, None]) -> int:
+    if isinstance(payload, (bytes, bytearray)):
+        return len(payload) // 4
+    return len(unpack_question_ids(payload))
 
 
 def import_tests_from_file(path: str) -> int:
@@ -90,6 +301,8 @@ def import_tests_from_file(path: str) -> int:
 def _normalize_test_payload(test: Dict[str, Any]) -> Dict[str, Any]:
     title = test.get("title") or test.get("name")
     description = test.get("description")
+    time_limit = _positive_int(test.get("time_limit"))
+    question_time_limit = _positive_int(test.get("question_time_limit"))
     questions = test.get("questions") or []
     norm_questions: List[Dict[str, Any]] = []
     for q in questions:
@@ -113,7 +326,21 @@ def _normalize_test_payload(test: Dict[str, Any]) -> Dict[str, Any]:
                         is_ok = 0
                 norm_options.append({"text": o, "is_correct": is_ok})
         norm_questions.append({"text": qtext, "options": norm_options})
-    return {"title": title, "description": description, "questions": norm_questions}
+    return {
+        "title": title,
+        "description": description,
+        "time_limit": time_limit,
+        "question_time_limit": question_time_limit,
+        "questions": norm_questions,
+    }
+
+
+def _positive_int(value: Any) -> Optional[int]:
+    try:
+        n = int(value)
+    except (TypeError, ValueError):
+        return None
+    return n if n > 0 else None
 
 
 def import_tests_from_data(data: Any) -> int:
@@ -133,7 +360,10 @@ def import_tests_from_data(data: Any) -> int:
         norm = _normalize_test_payload(t)
         if not norm.get("title"):
             continue
-        cur.execute("INSERT INTO tests(title, description) VALUES(?, ?)", (norm["title"], norm.get("description")))
+        cur.execute(
+            "INSERT INTO tests(title, description, time_limit, question_time_limit) VALUES(?, ?, ?, ?)",
+            (norm["title"], norm.get("description"), norm.get("time_limit"), norm.get("question_time_limit")),
+        )
         test_id = cur.lastrowid
         for q in norm.get("questions", []):
             if not q.get("text"):
@@ -155,12 +385,10 @@ def import_tests_from_data(data: Any) -> int:
 
 def list_tests() -> List[sqlite3.Row]:
     init_db()
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute("SELECT id, title, COALESCE(description, '') AS description FROM tests ORDER BY id DESC")
-    rows = cur.fetchall()
-    conn.close()
-    return rows
+    with read_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT id, title, COALESCE(description, '') AS description FROM tests ORDER BY id DESC")
+        return cur.fetchall()
 
 
 def delete_test(test_id: int) -> int:
@@ -226,6 +454,17 @@ def _test_question_ids(test_id: int) -> List[int]:
     return ids
 
 
+def _test_time_limits(test_id: int) -> Tuple[Optional[int], Optional[int]]:
+    conn = get_connection()
+    cur = conn.cursor()
+    cur.execute("SELECT time_limit, question_time_limit FROM tests WHERE id = ?", (test_id,))
+    row = cur.fetchone()
+    conn.close()
+    if not row:
+        return None, None
+    return row[0], row[1]
+
+
 def create_session(user_id: int, test_id: int, limit_count: int) -> int:
     init_db()
     all_q_ids = _test_question_ids(test_id)
@@ -236,16 +475,34 @@ def create_session(user_id: int, test_id: int, limit_count: int) -> int:
     # shuffle question order and take the requested amount
     random.shuffle(all_q_ids)
     sel = all_q_ids[: min(limit_count, len(all_q_ids))]
-    payload = json.dumps(sel)
-    conn = get_connection()
+    payload = pack_question_ids(sel)
+    time_limit, question_time_limit = _test_time_limits(test_id)
+    now = time.time()
+    deadline_at = now + time_limit if time_limit else None
+    question_deadline_at = now + question_time_limit if question_time_limit else None
+    shard = _user_shard(user_id)
+    conn = get_session_connection(shard)
     cur = conn.cursor()
-    cur.execute(
-        """
-        INSERT INTO sessions(user_id, test_id, questions_json, limit_count)
-        VALUES(?, ?, ?, ?)
-        """,
-        (user_id, test_id, payload, len(sel)),
-    )
+    values = (user_id, test_id, payload, len(sel), deadline_at, question_time_limit, question_deadline_at)
+    if DB_SHARDS <= 1:
+        cur.execute(
+            """
+            INSERT INTO sessions(user_id, test_id, questions_json, limit_count,
+                                 deadline_at, question_time_limit, question_deadline_at)
+            VALUES(?, ?, ?, ?, ?, ?, ?)
+            """,
+            values,
+        )
+    else:
+        # next id congruent to the shard number, allocated under the shard's write lock
+        cur.execute(
+            """
+            INSERT INTO sessions(id, user_id, test_id, questions_json, limit_count,
+                                 deadline_at, question_time_limit, question_deadline_at)
+            SELECT COALESCE(MAX(id), ?) + ?, ?, ?, ?, ?, ?, ?, ? FROM sessions
+            """,
+            (shard, DB_SHARDS) + values,
+        )
     session_id = cur.lastrowid
     conn.commit()
     conn.close()
@@ -253,7 +510,7 @@ def create_session(user_id: int, test_id: int, limit_count: int) -> int:
 
 
 def get_active_session(user_id: int) -> Optional[sqlite3.Row]:
-    conn = get_connection()
+    conn = get_session_connection(_user_shard(user_id))
     cur = conn.cursor()
     cur.execute(
         "SELECT * FROM sessions WHERE user_id = ? AND status = 'active' ORDER BY id DESC LIMIT 1",
@@ -265,7 +522,7 @@ def get_active_session(user_id: int) -> Optional[sqlite3.Row]:
 
 
 def get_session(session_id: int) -> Optional[sqlite3.Row]:
-    conn = get_connection()
+    conn = get_session_connection(_session_shard(session_id))
     cur = conn.cursor()
     cur.execute("SELECT * FROM sessions WHERE id = ?", (session_id,))
     row = cur.fetchone()
@@ -277,7 +534,7 @@ def session_question_at(session_id: int, index: int) -> Optional[sqlite3.Row]:
     sess = get_session(session_id)
     if not sess:
         return None
-    q_ids = json.loads(sess["questions_json"]) or []
+    q_ids = unpack_question_ids(sess["questions_json"])
     if index < 0 or index >= len(q_ids):
         return None
     q_id = q_ids[index]
@@ -291,7 +548,7 @@ def session_question_at(session_id: int, index: int) -> Optional[sqlite3.Row]:
 
 def record_answer(session_id: int, question_id: int, option_id: int) -> bool:
     ok = is_option_correct(option_id)
-    conn = get_connection()
+    conn = get_session_connection(_session_shard(session_id))
     cur = conn.cursor()
     cur.execute(
         "INSERT INTO answers(session_id, question_id, option_id, is_correct) VALUES(?, ?, ?, ?)",
@@ -302,18 +559,33 @@ def record_answer(session_id: int, question_id: int, option_id: int) -> bool:
         UPDATE sessions
         SET total_answered = total_answered + 1,
             correct_count = correct_count + CASE WHEN ? = 1 THEN 1 ELSE 0 END,
-            current_index = current_index + 1
+            current_index = current_index + 1,
+            question_deadline_at = ? + question_time_limit
         WHERE id = ?
         """,
-        (1 if ok else 0, session_id),
+        (1 if ok else 0, time.time(), session_id),
     )
     conn.commit()
     conn.close()
     return ok
 
 
+# Called with the session id whenever a session leaves the 'active' state
+# (e.g. so the bot can drop its pending deadline timer).
+_session_closed_hooks: List[Callable[[int], None]] = []
+
+
+def add_session_closed_hook(hook: Callable[[int], None]) -> None:
+    _session_closed_hooks.append(hook)
+
+
+def _session_closed(session_id: int) -> None:
+    for hook in _session_closed_hooks:
+        hook(session_id)
+
+
 def stop_session(session_id: int) -> None:
-    conn = get_connection()
+    conn = get_session_connection(_session_shard(session_id))
     cur = conn.cursor()
     cur.execute(
         "UPDATE sessions SET status = 'stopped', ended_at = datetime('now') WHERE id = ?",
@@ -321,15 +593,16 @@ def stop_session(session_id: int) -> None:
     )
     conn.commit()
     conn.close()
+    _session_closed(session_id)
 
 
 def finish_if_done(session_id: int) -> bool:
     sess = get_session(session_id)
     if not sess:
         return True
-    q_ids = json.loads(sess["questions_json"]) or []
-    if sess["current_index"] >= len(q_ids):
-        conn = get_connection()
+    timed_out = sess["deadline_at"] is not None and time.time() >= sess["deadline_at"]
+    if timed_out or sess["current_index"] >= question_count(sess["questions_json"]):
+        conn = get_session_connection(_session_shard(session_id))
         cur = conn.cursor()
         cur.execute(
             "UPDATE sessions SET status = 'finished', ended_at = datetime('now') WHERE id = ?",
@@ -337,30 +610,183 @@ def finish_if_done(session_id: int) -> bool:
         )
         conn.commit()
         conn.close()
+        _session_closed(session_id)
         return True
     return False
 
 
-def user_results(user_id: int, limit: int = 5) -> List[sqlite3.Row]:
-    conn = get_connection()
+# -------- Session deadlines --------
+def session_deadline(sess: Optional[sqlite3.Row]) -> Optional[float]:
+    """Earliest pending deadline (unix time) of an active session, if any."""
+    if not sess or sess["status"] != "active":
+        return None
+    deadlines = [d for d in (sess["deadline_at"], sess["question_deadline_at"]) if d is not None]
+    return min(deadlines) if deadlines else None
+
+
+def active_session_deadlines() -> List[Tuple[int, float]]:
+    """(session_id, deadline) for every active timed session, used to re-arm timers on startup."""
+    init_db()
+    rows: List[Tuple[int, float]] = []
+    for shard in range(DB_SHARDS):
+        conn = get_session_connection(shard)
+        cur = conn.cursor()
+        cur.execute(
+            """
+            SELECT id, deadline_at, question_deadline_at FROM sessions
+            WHERE status = 'active' AND (deadline_at IS NOT NULL OR question_deadline_at IS NOT NULL)
+            """
+        )
+        rows.extend((r[0], min(d for d in (r[1], r[2]) if d is not None)) for r in cur.fetchall())
+        conn.close()
+    return rows
+
+
+def expire_session(session_id: int) -> Optional[str]:
+    """Apply whichever deadline of the session has passed.
+
+    Returns 'finished' if the session was closed, 'skipped' if only the current
+    question timed out (it counts as answered wrongly), or None if nothing was due.
+    """
+    sess = get_session(session_id)
+    if not sess or sess["status"] != "active":
+        return None
+    now = time.time()
+    if sess["deadline_at"] is not None and now >= sess["deadline_at"]:
+        finish_if_done(session_id)
+        return "finished"
+    if sess["question_deadline_at"] is None or now < sess["question_deadline_at"]:
+        return None
+    conn = get_session_connection(_session_shard(session_id))
     cur = conn.cursor()
     cur.execute(
         """
-        SELECT s.id, s.test_id, s.correct_count, s.total_answered, s.status, s.started_at, s.ended_at,
-               t.title
-        FROM sessions s
-        JOIN tests t ON t.id = s.test_id
-        WHERE s.user_id = ?
-        ORDER BY s.id DESC
-        LIMIT ?
+        UPDATE sessions
+        SET total_answered = total_answered + 1,
+            current_index = current_index + 1,
+            question_deadline_at = ? + question_time_limit
+        WHERE id = ? AND current_index = ? AND status = 'active'
         """,
-        (user_id, limit),
+        (now, session_id, sess["current_index"]),
     )
+    skipped = cur.rowcount
+    conn.commit()
+    conn.close()
+    if not skipped:
+        return None
+    return "finished" if finish_if_done(session_id) else "skipped"
+
+
+def user_results(user_id: int, limit: int = 5) -> List[sqlite3.Row]:
+    # with shards, tests resolve to the attached content store
+    with read_connection(shard_path(_user_shard(user_id))) as conn:
+        cur = conn.cursor()
+        cur.execute(
+            """
+            SELECT s.id, s.test_id, s.correct_count, s.total_answered, s.status, s.started_at, s.ended_at,
+                   t.title
+            FROM sessions s
+            JOIN tests t ON t.id = s.test_id
+            WHERE s.user_id = ?
+            ORDER BY s.id DESC
+            LIMIT ?
+            """,
+            (user_id, limit),
+        )
+        return cur.fetchall()
+
+
+# -------- Broadcasts --------
+def session_user_ids_after(after_user_id: int, limit: int) -> List[int]:
+    """Next page of distinct user ids that ever had a session, in ascending order."""
+    pages: List[List[int]] = []
+    for shard in range(DB_SHARDS):
+        with read_connection(shard_path(shard)) as conn:
+            cur = conn.cursor()
+            cur.execute(
+                "SELECT DISTINCT user_id FROM sessions WHERE user_id > ? ORDER BY user_id ASC LIMIT ?",
+                (after_user_id, limit),
+            )
+            pages.append([r[0] for r in cur.fetchall()])
+    # a user lives in exactly one shard, so the merged pages stay distinct
+    return list(heapq.merge(*pages))[:limit]
+
+
+def create_broadcast(admin_id: int, text: str) -> int:
+    """Store a broadcast as a 'draft'; nothing is sent until confirm_broadcast()."""
+    init_db()
+    conn = get_connection()
+    cur = conn.cursor()
+    cur.execute("INSERT INTO broadcasts(admin_id, text, status) VALUES(?, ?, 'draft')", (admin_id, text))
+    broadcast_id = cur.lastrowid
+    conn.commit()
+    conn.close()
+    return broadcast_id
+
+
+def confirm_broadcast(broadcast_id: int) -> bool:
+    """Move a draft to 'running'. Returns False if it was already confirmed or cancelled."""
+    conn = get_connection()
+    cur = conn.cursor()
+    cur.execute("UPDATE broadcasts SET status = 'running' WHERE id = ? AND status = 'draft'", (broadcast_id,))
+    affected = cur.rowcount
+    conn.commit()
+    conn.close()
+    return bool(affected)
+
+
+def cancel_broadcast(broadcast_id: int) -> bool:
+    conn = get_connection()
+    cur = conn.cursor()
+    cur.execute(
+        "UPDATE broadcasts SET status = 'cancelled', finished_at = datetime('now') WHERE id = ? AND status = 'draft'",
+        (broadcast_id,),
+    )
+    affected = cur.rowcount
+    conn.commit()
+    conn.close()
+    return bool(affected)
+
+
+def get_broadcast(broadcast_id: int) -> Optional[sqlite3.Row]:
+    conn = get_connection()
+    cur = conn.cursor()
+    cur.execute("SELECT * FROM broadcasts WHERE id = ?", (broadcast_id,))
+    row = cur.fetchone()
+    conn.close()
+    return row
+
+
+def running_broadcasts() -> List[sqlite3.Row]:
+    init_db()
+    conn = get_connection()
+    cur = conn.cursor()
+    cur.execute("SELECT * FROM broadcasts WHERE status = 'running' ORDER BY id ASC")
     rows = cur.fetchall()
     conn.close()
     return rows
 
 
+def save_broadcast_progress(
+    broadcast_id: int, last_user_id: int, delivered: int, failed: int, blocked: int, done: bool = False
+) -> None:
+    """Checkpoint a broadcast; every user id <= last_user_id has been handled."""
+    conn = get_connection()
+    cur = conn.cursor()
+    cur.execute(
+        """
+        UPDATE broadcasts
+        SET last_user_id = ?, delivered = ?, failed = ?, blocked = ?,
+            status = CASE WHEN ? THEN 'done' ELSE status END,
+            finished_at = CASE WHEN ? THEN datetime('now') ELSE finished_at END
+        WHERE id = ?
+        """,
+        (last_user_id, delivered, failed, blocked, done, done, broadcast_id),
+    )
+    conn.commit()
+    conn.close()
+
+
 if __name__ == "__main__":
     import sys
 
@@ -372,4 +798,3 @@ if __name__ == "__main__":
         print(f"Imported {n} tests into DB at {DB_PATH}")
     else:
         print("Usage:\n python backend.py init\n python backend.py import <tests.json>")
-
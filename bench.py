@@ -0,0 +1,257 @@
+"""Micro-benchmarks for the storage layer.
+
+Usage:
+ python bench.py encoding
+ python bench.py timers
+ python bench.py shards
+ python bench.py contention
+"""
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+import timeit
+from typing import Callable, Dict, List, Tuple
+
+import backend
+from timers import DeadlineScheduler
+
+
+def bench_encoding(n_questions: int = 2000, repeat: int = 2000) -> None:
+    """Compare JSON text vs packed uint32 blobs for sessions.questions_json."""
+    ids = random.sample(range(1, 10_000_000), n_questions)
+    as_json = json.dumps(ids)
+    as_blob = backend.pack_question_ids(ids)
+    assert list(backend.unpack_question_ids(as_blob)) == ids
+
+    print(f"questions per session: {n_questions}")
+    print(f"  json bytes: {len(as_json.encode()):>8}")
+    print(f"  blob bytes: {len(as_blob):>8}")
+
+    mid = n_questions // 2
+    cases = {
+        "json  decode + index": lambda: json.loads(as_json)[mid],
+        "blob  decode + index": lambda: backend.unpack_question_ids(as_blob)[mid],
+        "json  len": lambda: len(json.loads(as_json)),
+        "blob  len": lambda: backend.question_count(as_blob),
+    }
+    for name, fn in cases.items():
+        t = min(timeit.repeat(fn, number=repeat, repeat=5)) / repeat
+        print(f"  {name}: {t * 1e6:9.2f} us")
+
+
+def bench_timers(n_sessions: int = 100_000) -> None:
+    """Cost of keeping one deadline per active session in the shared scheduler."""
+    now = time.time()
+    sched = DeadlineScheduler()
+    rows = [(sid, now + random.uniform(10, 3600)) for sid in range(n_sessions)]
+
+    t0 = time.perf_counter()
+    sched.load(rows)
+    t_load = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    for sid, deadline in rows:
+        sched.schedule(sid, deadline + 30)  # e.g. next question's deadline
+    t_resched = time.perf_counter() - t0
+
+    print(f"sessions: {n_sessions}")
+    print(f"  reload from db rows: {t_load * 1e3:8.1f} ms")
+    print(f"  reschedule (each):   {t_resched / n_sessions * 1e6:8.2f} us")
+    _bench_timer_firing()
+
+
+def _bench_timer_firing(n_due: int = 2000) -> None:
+    """Fire ``n_due`` overdue sessions through start() and the bot's real expiry path.
+
+    Reports throughput and the worst event-loop stall seen by a 5 ms ticker,
+    i.e. how long a quiz handler could have been kept waiting.
+    """
+    import main  # the bot's deadline handler; needs aiogram
+
+    saved = backend.DB_PATH, backend.DB_SHARDS
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            backend.DB_PATH = os.path.join(tmp, "bench.sqlite3")
+            backend.DB_SHARDS = 1
+            questions = [{"text": f"q{i}", "options": ["a", "b"], "correct_index": 0} for i in range(5)]
+            backend.import_tests_from_data([{"title": "T", "question_time_limit": 600, "questions": questions}])
+            for user_id in range(1, n_due + 1):
+                backend.create_session(user_id, 1, 0)
+            conn = backend.get_connection()
+            conn.execute("UPDATE sessions SET question_deadline_at = ?", (time.time() - 1,))
+            conn.commit()
+            conn.close()
+
+            async def fire_all() -> Tuple[float, float]:
+                done = asyncio.Event()
+                fired = 0
+                max_lag = 0.0
+
+                async def callback(session_id: int) -> None:
+                    nonlocal fired
+                    _, _, _, deadline = await asyncio.to_thread(main._apply_deadline, session_id)
+                    sched.schedule(session_id, deadline)
+                    fired += 1
+                    if fired == n_due:
+                        done.set()
+
+                async def ticker() -> None:
+                    nonlocal max_lag
+                    while not done.is_set():
+                        t = time.perf_counter()
+                        await asyncio.sleep(0.005)
+                        max_lag = max(max_lag, time.perf_counter() - t - 0.005)
+
+                sched = DeadlineScheduler()
+                sched.load(backend.active_session_deadlines())
+                tick = asyncio.create_task(ticker())
+                t0 = time.perf_counter()
+                sched.start(callback)
+                await done.wait()
+                elapsed = time.perf_counter() - t0
+                await tick
+                await sched.stop()
+                return elapsed, max_lag
+
+            elapsed, max_lag = asyncio.run(fire_all())
+            skipped = backend.get_connection().execute("SELECT SUM(current_index) FROM sessions").fetchone()[0]
+            assert skipped == n_due
+    finally:
+        backend.DB_PATH, backend.DB_SHARDS = saved
+    print(f"  fire {n_due} overdue sessions (expire_session + reschedule):")
+    print(f"    {n_due / elapsed:8.0f} firings/s, worst loop stall {max_lag * 1e3:6.1f} ms")
+
+
+def _shard_writer(user_ids: List[int], answers: int, stop_at: float, counter) -> None:
+    done = 0
+    while time.time() < stop_at:
+        for user_id in user_ids:
+            session_id = backend.create_session(user_id, 1, 0)
+            for _ in range(answers):
+                backend.record_answer(session_id, 1, 1)
+            done += 1 + answers
+    with counter.get_lock():
+        counter.value += done
+
+
+def bench_shards(writers: int = 8, users_per_writer: int = 8, answers: int = 5, seconds: float = 5.0) -> None:
+    """Write throughput of the real create_session/record_answer path vs DB_SHARDS.
+
+    Sharding only helps when writers queue on one file's write lock, i.e. when
+    commits are slow (fsync on network or spinning storage). On fast local disk
+    the Python work per call dominates and the numbers stay flat.
+    """
+    ctx = multiprocessing.get_context("fork")
+    saved = backend.DB_PATH, backend.DB_SHARDS
+    print(f"writers: {writers}, users/writer: {users_per_writer}, answers/session: {answers}, {seconds:.0f}s per run")
+    print(f"  storage: {tempfile.gettempdir()}")
+    try:
+        for shards in (1, 2, 4, 8):
+            with tempfile.TemporaryDirectory() as tmp:
+                backend.DB_PATH = os.path.join(tmp, "bench.sqlite3")
+                backend.DB_SHARDS = shards
+                backend.import_tests_from_file(os.path.join(os.path.dirname(__file__), "tests.sample.json"))
+                counter = ctx.Value("l", 0)
+                stop_at = time.time() + seconds
+                jobs = [
+                    ctx.Process(
+                        target=_shard_writer,
+                        args=(list(range(w + 1, writers * users_per_writer + 1, writers)), answers, stop_at, counter),
+                    )
+                    for w in range(writers)
+                ]
+                for job in jobs:
+                    job.start()
+                for job in jobs:
+                    job.join()
+                print(f"  shards={shards}: {counter.value / seconds:8.0f} writes/s")
+    finally:
+        backend.DB_PATH, backend.DB_SHARDS = saved
+
+
+_RESULTS_SQL = """
+    SELECT s.id, s.correct_count, s.total_answered, s.status, t.title
+    FROM sessions s JOIN tests t ON t.id = s.test_id
+    WHERE s.user_id = ? ORDER BY s.id DESC LIMIT ?
+"""
+
+
+def _heavy_reader(read_only: bool, stop_at: float) -> None:
+    while time.time() < stop_at:
+        if read_only:
+            backend.user_results(1, limit=20_000)
+        else:
+            # pre-pool read path: a fresh read-write connection per call
+            conn = backend.get_connection()
+            conn.execute(_RESULTS_SQL, (1, 20_000)).fetchall()
+            conn.close()
+
+
+def bench_contention(readers: int = 3, answers: int = 300, history: int = 20_000) -> None:
+    """record_answer latency while other processes run large /results queries."""
+    ctx = multiprocessing.get_context("fork")
+    saved = backend.DB_PATH, backend.DB_SHARDS
+    print(f"readers: {readers}, answers: {answers}, sessions read per query: {history}")
+    modes = [
+        ("rollback journal, shared rw", "DELETE", False),
+        ("wal, shared rw", "WAL", False),
+        ("wal + read-only pool", "WAL", True),
+    ]
+    try:
+        for mode, journal_mode, read_only in modes:
+            with tempfile.TemporaryDirectory() as tmp:
+                backend.DB_PATH = os.path.join(tmp, "bench.sqlite3")
+                backend.DB_SHARDS = 1
+                backend.import_tests_from_file(os.path.join(os.path.dirname(__file__), "tests.sample.json"))
+                conn = backend.get_connection()
+                conn.execute(f"PRAGMA journal_mode={journal_mode}")
+                conn.executemany(
+                    "INSERT INTO sessions(user_id, test_id, questions_json, limit_count) VALUES(1, 1, x'', 0)",
+                    [()] * history,
+                )
+                conn.commit()
+                conn.close()
+                session_id = backend.create_session(2, 1, 0)
+
+                jobs = [ctx.Process(target=_heavy_reader, args=(read_only, time.time() + 60)) for _ in range(readers)]
+                for job in jobs:
+                    job.start()
+                time.sleep(0.5)
+                latencies = []
+                for _ in range(answers):
+                    t0 = time.perf_counter()
+                    backend.record_answer(session_id, 1, 1)
+                    latencies.append(time.perf_counter() - t0)
+                for job in jobs:
+                    job.terminate()
+                    job.join()
+
+                latencies.sort()
+                p50 = latencies[len(latencies) // 2]
+                p99 = latencies[int(len(latencies) * 0.99)]
+                print(f"  {mode:28}: p50 {p50 * 1e3:7.2f} ms  p99 {p99 * 1e3:7.2f} ms  max {latencies[-1] * 1e3:7.2f} ms")
+    finally:
+        backend.DB_PATH, backend.DB_SHARDS = saved
+
+
+BENCHES: Dict[str, Callable[[], None]] = {
+    "encoding": bench_encoding,
+    "timers": bench_timers,
+    "shards": bench_shards,
+    "contention": bench_contention,
+}
+
+
+if __name__ == "__main__":
+    names = sys.argv[1:] or list(BENCHES)
+    for name in names:
+        if name not in BENCHES:
+            print(__doc__)
+            sys.exit(1)
+        print(f"== {name}")
+        BENCHES[name]()
@@ -0,0 +1,134 @@
+import asyncio
+import logging
+import time
+from typing import Dict, List, Optional
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramAPIError, TelegramForbiddenError, TelegramRetryAfter
+
+from backend import get_broadcast, save_broadcast_progress, session_user_ids_after
+
+logger = logging.getLogger(__name__)
+
+PAGE_SIZE = 100
+# Progress is saved after this many users; bounds re-sends after a crash.
+CHECKPOINT_EVERY = 10
+CONCURRENCY = 8
+# Telegram allows ~30 messages/s per bot; leave headroom for quiz replies.
+MESSAGES_PER_SECOND = 20.0
+
+
+class RateLimiter:
+    """Spaces out acquire() calls to at most ``rate`` per second across all workers."""
+
+    def __init__(self, rate: float) -> None:
+        self._interval = 1.0 / rate
+        self._next = 0.0
+
+    async def acquire(self) -> None:
+        now = time.monotonic()
+        slot = max(now, self._next)
+        self._next = slot + self._interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+    def pause(self, seconds: float) -> None:
+        """Hold back every caller for ``seconds`` (Telegram flood wait)."""
+        self._next = max(self._next, time.monotonic() + seconds)
+
+
+# Shared by every broadcast in the process, so concurrent or resumed runs
+# together stay under MESSAGES_PER_SECOND.
+LIMITER = RateLimiter(MESSAGES_PER_SECOND)
+
+
+async def _send(bot: Bot, limiter: RateLimiter, user_id: int, text: str) -> str:
+    # A flood wait is not a per-user failure: pause all workers and retry the
+    # same user, so the checkpoint never moves past someone we did not reach.
+    while True:
+        await limiter.acquire()
+        try:
+            await bot.send_message(user_id, text)
+            return "delivered"
+        except TelegramRetryAfter as e:
+            limiter.pause(e.retry_after)
+        except TelegramForbiddenError:
+            return "blocked"
+        except TelegramAPIError as e:
+            logger.info("Broadcast to %s failed: %s", user_id, e)
+            return "failed"
+
+
+class _Checkpoint:
+    """Broadcast progress as the longest fully handled prefix of users, in user_id order.
+
+    Sends finish out of order across workers; a user only counts once every
+    lower id in the page is done too, so after a crash nobody below
+    ``last_user_id`` is re-sent and nobody above it is counted twice.
+    """
+
+    def __init__(self, broadcast_id: int, after: int, counts: Dict[str, int]) -> None:
+        self.broadcast_id = broadcast_id
+        self.after = after
+        self.counts = counts
+        self._unsaved = 0
+        self._lock = asyncio.Lock()
+
+    def advance(self, user_id: int, outcome: str) -> None:
+        self.after = user_id
+        self.counts[outcome] += 1
+        self._unsaved += 1
+
+    async def maybe_save(self) -> None:
+        if self._unsaved >= CHECKPOINT_EVERY:
+            await self.save()
+
+    async def save(self, done: bool = False) -> None:
+        # serialised, and the snapshot is taken under the lock, so saves never go backwards
+        async with self._lock:
+            self._unsaved = 0
+            await asyncio.to_thread(
+                save_broadcast_progress, self.broadcast_id, self.after, **self.counts, done=done
+            )
+
+
+async def _send_page(bot: Bot, user_ids: List[int], text: str, checkpoint: _Checkpoint) -> None:
+    queue: asyncio.Queue = asyncio.Queue()
+    for i in range(len(user_ids)):
+        queue.put_nowait(i)
+    results: List[Optional[str]] = [None] * len(user_ids)
+    next_pos = 0
+
+    async def worker() -> None:
+        nonlocal next_pos
+        while not queue.empty():
+            i = queue.get_nowait()
+            results[i] = await _send(bot, LIMITER, user_ids[i], text)
+            while next_pos < len(user_ids) and results[next_pos] is not None:
+                checkpoint.advance(user_ids[next_pos], results[next_pos])
+                next_pos += 1
+            await checkpoint.maybe_save()
+
+    await asyncio.gather(*(worker() for _ in range(min(CONCURRENCY, len(user_ids)))))
+
+
+async def run_broadcast(bot: Bot, broadcast_id: int) -> Dict[str, int]:
+    """Send a broadcast to every user that ever had a session, resuming from its checkpoint.
+
+    Users are streamed from the sessions table PAGE_SIZE at a time and progress
+    is saved every CHECKPOINT_EVERY handled users, so a restart re-sends at most
+    that many plus the sends that were in flight.
+    """
+    row = await asyncio.to_thread(get_broadcast, broadcast_id)
+    if not row:
+        raise ValueError("Broadcast topilmadi")
+    counts = {"delivered": row["delivered"], "failed": row["failed"], "blocked": row["blocked"]}
+    checkpoint = _Checkpoint(broadcast_id, int(row["last_user_id"]), counts)
+    if row["status"] == "running":
+        while True:
+            user_ids = await asyncio.to_thread(session_user_ids_after, checkpoint.after, PAGE_SIZE)
+            if not user_ids:
+                break
+            await _send_page(bot, user_ids, row["text"], checkpoint)
+        await checkpoint.save(done=True)
+    return counts
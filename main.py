@@ -1,11 +1,12 @@
 import asyncio
 import os
-import json
 import random
-from typing import List, Optional, Dict
+import sqlite3
+import time
+from typing import List, Optional, Dict, Set
 
 from aiogram import Bot, Dispatcher, F
-from aiogram.filters import Command
+from aiogram.filters import Command, CommandObject
 from aiogram.types import CallbackQuery, InlineKeyboardButton, InlineKeyboardMarkup, Message
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 
@@ -26,7 +27,18 @@ from backend import (
     finish_if_done,
     user_results,
     get_session,
+    question_count,
+    add_session_closed_hook,
+    session_deadline,
+    active_session_deadlines,
+    expire_session,
+    create_broadcast,
+    confirm_broadcast,
+    cancel_broadcast,
+    running_broadcasts,
 )
+from broadcast import run_broadcast
+from timers import DeadlineScheduler
 
 
 # BOT_TOKEN = os.environ.get("BOT_TOKEN", "")
@@ -36,9 +48,15 @@ ADMIN_IDS = [6550264522]
 
 PENDING_COUNT: Dict[int, int] = {}
 
+# one scheduler for all timed sessions; finished/stopped sessions drop out via the hook
+TIMERS = DeadlineScheduler()
+add_session_closed_hook(TIMERS.cancel)
 
-def tests_keyboard() -> InlineKeyboardMarkup:
-    rows = list_tests()
+# keep references to fire-and-forget tasks (broadcasts) so they are not garbage-collected
+BACKGROUND_TASKS: Set[asyncio.Task] = set()
+
+
+def tests_keyboard(rows: List[sqlite3.Row]) -> InlineKeyboardMarkup:
     kb = InlineKeyboardBuilder()
     for r in rows:
         kb.button(text=r["title"], callback_data=f"choose_test:{r['id']}")
@@ -55,9 +73,13 @@ def render_question(session_id: int, index: int) -> Optional[tuple[str, InlineKe
     options = list(options)
     random.shuffle(options)
     sess = get_session(session_id)
-    total = len(json.loads(sess["questions_json"])) if sess else 0
+    total = question_count(sess["questions_json"]) if sess else 0
     lines: List[str] = []
     lines.append(f"Savol {index + 1}/{total}:")
+    deadline = session_deadline(sess)
+    if deadline is not None:
+        left = max(0, int(deadline - time.time()))
+        lines.append(f"⏱ Qolgan vaqt: {left // 60}:{left % 60:02d}")
     lines.append(q["text"])
     lines.append("")
     lines.append("Variantlar:")
@@ -73,6 +95,38 @@ def render_question(session_id: int, index: int) -> Optional[tuple[str, InlineKe
     return text, kb.as_markup()
 
 
+def arm_timer(session_id: int) -> None:
+    TIMERS.schedule(session_id, session_deadline(get_session(session_id)))
+
+
+def _apply_deadline(session_id: int):
+    """Blocking part of a deadline firing; runs in a worker thread."""
+    outcome = expire_session(session_id)
+    sess = get_session(session_id)
+    nxt = None
+    if sess and outcome == "skipped":
+        nxt = render_question(session_id, int(sess["current_index"]))
+    return outcome, sess, nxt, session_deadline(sess)
+
+
+async def on_deadline(bot: Bot, session_id: int) -> None:
+    outcome, sess, nxt, deadline = await asyncio.to_thread(_apply_deadline, session_id)
+    if not sess:
+        return
+    # re-arm first: the scheduler already dropped this entry, and a failed send
+    # must not leave the session without a deadline
+    TIMERS.schedule(session_id, deadline)
+    if outcome == "finished":
+        await bot.send_message(
+            sess["user_id"],
+            f"⏱ Vaqt tugadi. Natija: {sess['correct_count']}/{sess['total_answered']}. /start",
+        )
+    elif outcome == "skipped" and nxt:
+        text, kb = nxt
+        await bot.send_message(sess["user_id"], "⏱ Vaqt tugadi, keyingi savol.")
+        await bot.send_message(sess["user_id"], text, reply_markup=kb)
+
+
 def _is_admin(user_id: Optional[int]) -> bool:
     return bool(user_id and (user_id in ADMIN_IDS))
 
@@ -94,7 +148,7 @@ async def prompt_counts(call: CallbackQuery, test_id: int):
 
 async def on_start(message: Message):
     init_db()
-    tests = list_tests()
+    tests = await asyncio.to_thread(list_tests)
     if not tests:
         await message.answer(
             "Hali testlar mavjud emas. Admin JSON orqali yuklashi kerak. /help ni bosing."
@@ -104,10 +158,10 @@ async def on_start(message: Message):
     if sess:
         kb = InlineKeyboardBuilder()
         kb.button(text="Davom etish", callback_data=f"resume:{sess['id']}")
-        await message.answer("Testni tanlang:", reply_markup=tests_keyboard())
+        await message.answer("Testni tanlang:", reply_markup=tests_keyboard(tests))
         await message.answer("Sizda davom etayotgan test bor.", reply_markup=kb.as_markup())
     else:
-        await message.answer("Testni tanlang:", reply_markup=tests_keyboard())
+        await message.answer("Testni tanlang:", reply_markup=tests_keyboard(tests))
 
 
 async def on_help(message: Message):
@@ -116,7 +170,7 @@ async def on_help(message: Message):
         "/start — testni tanlash\n"
         "/help — yordam\n"
         "/results — natijalar\n"
-        "Adminlar uchun: /admin yoki JSON faylni yuboring (.json)"
+        "Adminlar uchun: /admin, /broadcast <matn> yoki JSON faylni yuboring (.json)"
     )
     await message.answer(text)
 
@@ -143,6 +197,10 @@ async def on_answer(call: CallbackQuery):
         await call.answer("Xatolik.", show_alert=True)
         return
 
+    sess = get_session(session_id)
+    if not sess or sess["status"] != "active" or int(sess["current_index"]) != q_index:
+        await call.answer("Mavjud emas.")
+        return
     q = session_question_at(session_id, q_index)
     if not q:
         await call.answer("Mavjud emas.")
@@ -160,6 +218,7 @@ async def on_answer(call: CallbackQuery):
         )
         return
 
+    arm_timer(session_id)
     nxt = render_question(session_id, q_index + 1)
     if nxt:
         text, kb = nxt
@@ -201,6 +260,7 @@ async def on_choose_count(call: CallbackQuery):
     if old:
         stop_session(old["id"])
     session_id = create_session(user_id, test_id, count)
+    arm_timer(session_id)
     first = render_question(session_id, 0)
     if not first:
         await call.message.edit_text("Savol topilmadi.")
@@ -236,6 +296,7 @@ async def on_custom_number(message: Message):
     if old:
         stop_session(old["id"])
     session_id = create_session(message.from_user.id, test_id, count)
+    arm_timer(session_id)
     first = render_question(session_id, 0)
     if not first:
         await message.answer("Savol topilmadi.")
@@ -280,7 +341,8 @@ async def on_resume(call: CallbackQuery):
 async def on_results(message: Message):
     if not message.from_user:
         return
-    rows = user_results(message.from_user.id, limit=10)
+    # read-only snapshot query, kept off the event loop so answers are not delayed
+    rows = await asyncio.to_thread(user_results, message.from_user.id, 10)
     if not rows:
         await message.answer("Natijalar yo'q.")
         return
@@ -295,7 +357,7 @@ async def on_results(message: Message):
 async def on_admin(message: Message):
     if not _is_admin(message.from_user.id if message.from_user else None):
         return
-    rows = list_tests()
+    rows = await asyncio.to_thread(list_tests)
     if not rows:
         await message.answer("Testlar yo'q.")
         return
@@ -306,6 +368,66 @@ async def on_admin(message: Message):
     await message.answer("Admin panel — testlarni o'chirish:", reply_markup=kb.as_markup())
 
 
+def start_broadcast(bot: Bot, broadcast_id: int, admin_id: int) -> None:
+    async def job() -> None:
+        try:
+            counts = await run_broadcast(bot, broadcast_id)
+        except Exception as e:
+            await bot.send_message(admin_id, f"Xabar yuborish #{broadcast_id} xato: {e}")
+            return
+        await bot.send_message(
+            admin_id,
+            f"Xabar yuborish #{broadcast_id} tugadi.\n"
+            f"Yetkazildi: {counts['delivered']}\n"
+            f"Xato: {counts['failed']}\n"
+            f"Bloklagan: {counts['blocked']}",
+        )
+
+    task = asyncio.create_task(job())
+    BACKGROUND_TASKS.add(task)
+    task.add_done_callback(BACKGROUND_TASKS.discard)
+
+
+async def on_broadcast(message: Message, command: CommandObject):
+    if not _is_admin(message.from_user.id if message.from_user else None):
+        return
+    # args is everything after the command, split on any whitespace (newlines kept inside)
+    text = (command.args or "").strip()
+    if not text:
+        await message.reply("Foydalanish: /broadcast <matn>")
+        return
+    broadcast_id = create_broadcast(message.from_user.id, text)
+    kb = InlineKeyboardBuilder()
+    kb.button(text="Ha, yuborish", callback_data=f"bc_yes:{broadcast_id}")
+    kb.button(text="Bekor qilish", callback_data=f"bc_no:{broadcast_id}")
+    kb.adjust(2)
+    await message.reply(
+        f"Barcha foydalanuvchilarga quyidagi xabar yuboriladi:\n\n{text}\n\nTasdiqlaysizmi?",
+        reply_markup=kb.as_markup(),
+    )
+
+
+async def on_broadcast_confirm(call: CallbackQuery, bot: Bot):
+    if not _is_admin(call.from_user.id if call.from_user else None):
+        await call.answer("Ruxsat yo'q.", show_alert=True)
+        return
+    try:
+        action, bid = call.data.split(":")
+        broadcast_id = int(bid)
+    except Exception:
+        await call.answer("Xatolik.")
+        return
+    if action == "bc_yes" and confirm_broadcast(broadcast_id):
+        start_broadcast(bot, broadcast_id, call.from_user.id)
+        await call.message.edit_text(f"Xabar yuborish #{broadcast_id} boshlandi.")
+    elif action == "bc_no" and cancel_broadcast(broadcast_id):
+        await call.message.edit_text("Bekor qilindi.")
+    else:
+        await call.answer("Allaqachon ko'rib chiqilgan.")
+        return
+    await call.answer()
+
+
 async def on_delete_request(call: CallbackQuery):
     if not _is_admin(call.from_user.id if call.from_user else None):
         await call.answer("Ruxsat yo'q.", show_alert=True)
@@ -354,6 +476,7 @@ def setup_dispatcher(dp: Dispatcher):
     dp.message.register(on_help, Command("help"))
     dp.message.register(on_results, Command("results"))
     dp.message.register(on_admin, Command("admin"))
+    dp.message.register(on_broadcast, Command("broadcast"))
     dp.message.register(on_admin_json, F.document)
     dp.message.register(on_custom_number, F.text)
     dp.callback_query.register(on_select_test, F.data.startswith("choose_test:"))
@@ -365,6 +488,7 @@ def setup_dispatcher(dp: Dispatcher):
     dp.callback_query.register(on_delete_request, F.data.startswith("del_req:"))
     dp.callback_query.register(on_delete_confirm, F.data.startswith("del_yes:"))
     dp.callback_query.register(on_delete_cancel, F.data == "del_cancel")
+    dp.callback_query.register(on_broadcast_confirm, F.data.startswith("bc_yes:") | F.data.startswith("bc_no:"))
 
 
 async def main() -> None:
@@ -373,7 +497,15 @@ async def main() -> None:
     bot = Bot(BOT_TOKEN)
     dp = Dispatcher()
     setup_dispatcher(dp)
-    await dp.start_polling(bot)
+    init_db()
+    TIMERS.load(active_session_deadlines())
+    TIMERS.start(lambda session_id: on_deadline(bot, session_id))
+    for b in running_broadcasts():
+        start_broadcast(bot, b["id"], b["admin_id"])
+    try:
+        await dp.start_polling(bot)
+    finally:
+        await TIMERS.stop()
 
 
 if __name__ == "__main__":
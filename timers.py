@@ -0,0 +1,126 @@
+import asyncio
+import heapq
+import logging
+import time
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class DeadlineScheduler:
+    """Single-task timer for session deadlines.
+
+    All pending deadlines live in one min-heap keyed by unix time, so the cost
+    per session is a heap entry rather than an asyncio task. Rescheduling or
+    cancelling only updates ``_deadlines``; outdated heap entries are skipped
+    when popped and the heap is rebuilt once they dominate it.
+
+    Due sessions are handed to a fixed pool of ``workers`` tasks, so a burst of
+    expiries (e.g. everything overdue after a restart) runs at most that many
+    callbacks at once.
+    """
+
+    def __init__(self, workers: int = 8) -> None:
+        self._heap: List[Tuple[float, int]] = []
+        self._deadlines: Dict[int, float] = {}
+        self._workers = workers
+        # created in start(), inside the running loop
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._due: Optional["asyncio.Queue[int]"] = None
+        self._tasks: List[asyncio.Task] = []
+
+    def __len__(self) -> int:
+        return len(self._deadlines)
+
+    def load(self, items: Iterable[Tuple[int, float]]) -> None:
+        """Bulk-insert deadlines (e.g. reloaded from the sessions table)."""
+        self._deadlines.update(items)
+        self._rebuild()
+
+    def schedule(self, session_id: int, deadline: Optional[float]) -> None:
+        if deadline is None:
+            self.cancel(session_id)
+            return
+        if self._deadlines.get(session_id) == deadline:
+            return
+        self._deadlines[session_id] = deadline
+        earliest = self._heap[0][0] if self._heap else None
+        heapq.heappush(self._heap, (deadline, session_id))
+        if earliest is None or deadline < earliest:
+            self._notify()
+        self._maybe_compact()
+
+    def cancel(self, session_id: int) -> None:
+        """Drop a session's deadline. Safe to call from worker threads."""
+        if self._loop is not None and not self._on_loop():
+            self._loop.call_soon_threadsafe(self.cancel, session_id)
+            return
+        if self._deadlines.pop(session_id, None) is not None:
+            self._maybe_compact()
+
+    def start(self, callback: Callable[[int], Awaitable[None]]) -> None:
+        if self._tasks:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._due = asyncio.Queue()
+        self._tasks = [asyncio.create_task(self._run())]
+        self._tasks += [asyncio.create_task(self._worker(callback)) for _ in range(self._workers)]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._loop = None
+
+    def _on_loop(self) -> bool:
+        try:
+            return asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            return False
+
+    def _rebuild(self) -> None:
+        self._heap = [(d, sid) for sid, d in self._deadlines.items()]
+        heapq.heapify(self._heap)
+        self._notify()
+
+    def _notify(self) -> None:
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def _maybe_compact(self) -> None:
+        if len(self._heap) > 2 * len(self._deadlines) + 64:
+            self._rebuild()
+
+    def _pop_due(self, now: float) -> List[int]:
+        due: List[int] = []
+        while self._heap and self._heap[0][0] <= now:
+            deadline, session_id = heapq.heappop(self._heap)
+            if self._deadlines.get(session_id) != deadline:
+                continue  # cancelled or rescheduled
+            del self._deadlines[session_id]
+            due.append(session_id)
+        return due
+
+    async def _worker(self, callback: Callable[[int], Awaitable[None]]) -> None:
+        assert self._due is not None
+        while True:
+            session_id = await self._due.get()
+            try:
+                await callback(session_id)
+            except Exception:
+                logger.exception("Deadline callback failed for session %s", session_id)
+
+    async def _run(self) -> None:
+        assert self._wakeup is not None and self._due is not None
+        while True:
+            for session_id in self._pop_due(time.time()):
+                self._due.put_nowait(session_id)
+            self._wakeup.clear()
+            timeout = max(0.0, self._heap[0][0] - time.time()) if self._heap else None
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass